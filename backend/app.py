@@ -6,10 +6,20 @@ from database import (
     save_user,
     get_groups,
     save_feedback,
+    save_schedule,
+    get_changes,
     get_skill_match_stats,
     get_skill_distribution,
 )
-from recommender import initialize_groups, match_student_to_group, get_existing_groups
+from recommender import (
+    initialize_groups,
+    rebuild_groups,
+    rebuild_partition,
+    rebuild_user_partitions,
+    get_user_profile,
+    match_student_to_group,
+    get_existing_groups,
+)
 import logging
 import sqlite3
 
@@ -82,13 +92,8 @@ def register():
             app.logger.error(f"Register failed: Failed to create user for email {email}")
             return jsonify({'error': 'Failed to create user'}), 500
         
-        # Clear groups to avoid conflicts
-        conn = get_db_connection()
-        with conn:
-            conn.execute("DELETE FROM groups")
-        conn.close()
-
-        initialize_groups()
+        # Regroup only the partition the new user falls into
+        rebuild_user_partitions(get_user_profile(email))
         existing_groups = get_existing_groups()
         user = get_user_by_email(email)
         profile = {
@@ -133,22 +138,25 @@ def update_profile():
     availability = [a.strip() for a in data.get('availability', ['TBD']) if isinstance(a, str)]
 
     try:
+        previous_profile = get_user_profile(email)
+        # Keep the stored cohort when the client does not send one
+        if isinstance(data.get('cohort'), str):
+            cohort = data['cohort'].strip()
+        else:
+            cohort = (previous_profile or {}).get('cohort', '')
+
         # Update existing user - save_user should handle updates for existing email
         save_user(
             email=email,
             name=data.get('name', '').strip(),
             skills=','.join(skills),
             interests=','.join(interests),
-            availability=','.join(availability) if availability else 'TBD'
+            availability=','.join(availability) if availability else 'TBD',
+            cohort=cohort
         )
 
-        # Clear groups to refresh after profile update
-        conn = get_db_connection()
-        with conn:
-            conn.execute("DELETE FROM groups")
-        conn.close()
-
-        initialize_groups()
+        # Regroup the partitions the user left and joined
+        rebuild_user_partitions(previous_profile, get_user_profile(email))
         existing_groups = get_existing_groups()
         user = get_user_by_email(email)
         profile = {
@@ -169,13 +177,29 @@ def update_profile():
 
 @app.route('/api/reinitialize-groups', methods=['POST'])
 def reinitialize_groups_route():
+    data = request.get_json(silent=True) or {}
+    partition_by = data.get('partitionBy')
+    partition = data.get('partition')
+    min_bucket_size = data.get('minBucketSize')
+
     try:
-        conn = get_db_connection()
-        with conn:
-            conn.execute("DELETE FROM groups")
-        conn.close()
-        initialize_groups()
-        return jsonify({'message': 'Groups reinitialized'})
+        if min_bucket_size is not None and (not isinstance(min_bucket_size, int) or min_bucket_size < 1):
+            raise ValueError('minBucketSize must be a positive integer')
+
+        if partition is not None:
+            if not partition_by or not isinstance(partition, str):
+                raise ValueError('partition requires partitionBy and must be a string')
+            stats = rebuild_partition(partition_by, partition, min_bucket_size=min_bucket_size)
+            return jsonify({'message': f'Partition {partition} reinitialized', 'created': stats['created'], 'stats': stats})
+
+        if partition_by:
+            stats = rebuild_groups(partition_by, min_bucket_size=min_bucket_size)
+        else:
+            stats = rebuild_groups(min_bucket_size=min_bucket_size)
+        return jsonify({'message': 'Groups reinitialized', 'created': stats['created'], 'stats': stats})
+    except ValueError as e:
+        app.logger.error(f"Reinitialize groups failed: {str(e)}")
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         app.logger.error(f"Reinitialize groups failed: {str(e)}")
         return jsonify({'error': f'Reinitialize groups failed: {str(e)}'}), 500
@@ -249,18 +273,30 @@ def schedule_session():
         return jsonify({'error': 'Missing required fields'}), 400
 
     try:
-        conn = get_db_connection()
-        with conn:
-            conn.execute(
-                'INSERT INTO schedules (group_id, date, start_time, end_time, location, agenda) VALUES (?, ?, ?, ?, ?, ?)',
-                (group_id, date, start_time, end_time, location, agenda)
-            )
-        conn.close()
+        save_schedule(group_id, date, start_time, end_time, location, agenda)
         return jsonify({'message': 'Schedule added successfully'}), 201
     except Exception as e:
         app.logger.error(f"Schedule session failed: {str(e)}")
         return jsonify({'error': f'Schedule session failed: {str(e)}'}), 500
 
+@app.route('/api/changes', methods=['GET'])
+def get_changes_route():
+    try:
+        since = int(request.args.get('since', 0))
+        limit = max(1, min(int(request.args.get('limit', 500)), 5000))
+    except ValueError:
+        return jsonify({'error': 'since and limit must be integers'}), 400
+    if since < 0:
+        return jsonify({'error': 'since must not be negative'}), 400
+
+    try:
+        changes, has_more = get_changes(since, limit)
+        latest = changes[-1]['seq'] if changes else since
+        return jsonify({'changes': changes, 'latest': latest, 'hasMore': has_more})
+    except Exception as e:
+        app.logger.error(f"Get changes failed: {str(e)}")
+        return jsonify({'error': f'Get changes failed: {str(e)}'}), 500
+
 @app.route('/api/skill-match-stats', methods=['GET'])
 def skill_match_stats():
     try:
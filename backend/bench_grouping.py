@@ -0,0 +1,72 @@
+"""Benchmark the grouping pipeline without writing to the database.
+
+Usage:
+    python bench_grouping.py                 # synthetic profiles
+    python bench_grouping.py --users 5000 --partition-by skill --workers 4
+    python bench_grouping.py --from-db       # current users table
+"""
+import argparse
+import logging
+import random
+import time
+
+from recommender import (
+    PARTITION_KEYS,
+    GROUPING_STAGES,
+    cluster_partitions,
+    get_user_profiles,
+    partition_profiles,
+)
+
+SKILLS = ['python', 'flask', 'django', 'database', 'ml', 'data analysis', 'ux', 'ui',
+          'management', 'docs', 'backend', 'javascript', 'react', 'biology', 'video']
+SLOTS = ['Mon 10-12', 'Mon 14-16', 'Tue 10-12', 'Tue 14-16', 'Wed 10-12',
+         'Wed 14-16', 'Thu 10-12', 'Thu 14-16', 'Fri 10-12', 'Fri 14-16']
+COHORTS = ['cs101', 'cs201', 'ds101', 'design']
+
+def synthetic_profiles(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            'id': i,
+            'name': f"User {i}",
+            'email': f"user{i}@example.com",
+            'skills': rng.sample(SKILLS, rng.randint(0, 3)),
+            'availability': rng.sample(SLOTS, rng.randint(1, 2)),
+            'cohort': rng.choice(COHORTS)
+        }
+        for i in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--from-db', action='store_true')
+    parser.add_argument('--partition-by', choices=PARTITION_KEYS)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--min-bucket-sizes', default='1,2,3,5')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    profiles = get_user_profiles() if args.from_db else synthetic_profiles(args.users)
+    partitions = partition_profiles(profiles, args.partition_by)
+    print(f"{len(profiles)} profiles, {len(partitions)} partitions, {args.workers} workers")
+
+    header = f"{'min':>4} {'groups':>7} {'avg size':>9} {'seconds':>8}"
+    for stage in GROUPING_STAGES:
+        header += f" {stage + ' g/m/s':>22}"
+    print(header)
+
+    for min_bucket_size in [int(v) for v in args.min_bucket_sizes.split(',')]:
+        start = time.perf_counter()
+        groups, stats = cluster_partitions(partitions, args.workers, min_bucket_size)
+        elapsed = time.perf_counter() - start
+        avg_size = len(profiles) / len(groups) if groups else 0
+        line = f"{min_bucket_size:>4} {len(groups):>7} {avg_size:>9.2f} {elapsed:>8.3f}"
+        for stage in GROUPING_STAGES:
+            cell = '{groups}/{members}/{seconds:.3f}'.format(**stats[stage])
+            line += f" {cell:>22}"
+        print(line)
+
+if __name__ == '__main__':
+    main()
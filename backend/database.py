@@ -1,4 +1,5 @@
 import sqlite3
+import json
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -30,7 +31,8 @@ def init_db():
             name TEXT,
             skills TEXT,
             interests TEXT,
-            availability TEXT
+            availability TEXT,
+            cohort TEXT
         )
     ''')
 
@@ -41,7 +43,8 @@ def init_db():
             members TEXT,
             matching_skills TEXT,
             study_time TEXT,
-            status TEXT
+            status TEXT,
+            partition_key TEXT
         )
     ''')
 
@@ -71,12 +74,30 @@ def init_db():
         )
     ''')
 
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER,
+            op TEXT NOT NULL,
+            payload TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
     cursor.execute("PRAGMA table_info(groups)")
     columns = [col['name'] for col in cursor.fetchall()]
     if 'name' not in columns:
         cursor.execute('ALTER TABLE groups ADD COLUMN name TEXT')
     if 'members' not in columns:
         cursor.execute('ALTER TABLE groups ADD COLUMN members TEXT')
+    if 'partition_key' not in columns:
+        cursor.execute('ALTER TABLE groups ADD COLUMN partition_key TEXT')
+
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [col['name'] for col in cursor.fetchall()]
+    if 'cohort' not in columns:
+        cursor.execute('ALTER TABLE users ADD COLUMN cohort TEXT')
     
     for user in SAMPLE_DATA:
         cursor.execute(
@@ -111,6 +132,41 @@ def init_db():
     conn.commit()
     conn.close()
 
+def record_change(cursor, entity, entity_id, op, payload=None):
+    """Append a change log entry using the caller's cursor.
+
+    Must be called inside the same transaction as the mutation it describes
+    so the log never disagrees with the tables it tracks.
+    """
+    cursor.execute(
+        'INSERT INTO changes (entity, entity_id, op, payload) VALUES (?, ?, ?, ?)',
+        (entity, entity_id, op, json.dumps(payload) if payload is not None else None)
+    )
+    return cursor.lastrowid
+
+def get_changes(since=0, limit=500):
+    """Return up to ``limit`` changes after ``since`` and whether more remain."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # Fetch one extra row to tell a full last page from a partial one
+    cursor.execute(
+        'SELECT seq, entity, entity_id, op, payload, created_at FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+        (since, limit + 1)
+    )
+    changes = [
+        {
+            'seq': row['seq'],
+            'entity': row['entity'],
+            'entityId': row['entity_id'],
+            'op': row['op'],
+            'data': json.loads(row['payload']) if row['payload'] else None,
+            'created_at': row['created_at']
+        }
+        for row in cursor.fetchall()
+    ]
+    conn.close()
+    return changes[:limit], len(changes) > limit
+
 def get_user_by_email(email):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -119,17 +175,45 @@ def get_user_by_email(email):
     conn.close()
     return user
 
-def save_user(email, name, skills='', interests='', availability='TBD'):
+def save_user(email, name, skills='', interests='', availability='TBD', cohort=''):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        'INSERT OR REPLACE INTO users (email, name, skills, interests, availability) VALUES (?, ?, ?, ?, ?)',
-        (email, name, skills, interests, availability)
-    )
-    cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
-    user_id = cursor.fetchone()['id']
-    conn.commit()
-    conn.close()
+    try:
+        # Take the write lock before looking the user up so concurrent saves
+        # of the same email cannot both take the INSERT branch
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
+        existing = cursor.fetchone()
+        if existing:
+            # Update in place so the user keeps their id
+            user_id = existing['id']
+            cursor.execute(
+                'UPDATE users SET name = ?, skills = ?, interests = ?, availability = ?, cohort = ? WHERE id = ?',
+                (name, skills, interests, availability, cohort, user_id)
+            )
+            op = 'update'
+        else:
+            cursor.execute(
+                'INSERT INTO users (email, name, skills, interests, availability, cohort) VALUES (?, ?, ?, ?, ?, ?)',
+                (email, name, skills, interests, availability, cohort)
+            )
+            user_id = cursor.lastrowid
+            op = 'insert'
+        # The feed is unauthenticated and email doubles as the login, so it
+        # is left out; everything else the app aggregates on is included
+        record_change(cursor, 'user', user_id, op, {
+            'name': name,
+            'skills': skills.split(',') if skills else [],
+            'interests': interests.split(',') if interests else [],
+            'availability': availability.split(',') if availability else [],
+            'cohort': cohort
+        })
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
     return user_id
 
 def get_groups():
@@ -171,10 +255,36 @@ def save_feedback(group_id, user_id, content, rating):
         (group_id, user_id, content, rating)
     )
     feedback_id = cursor.lastrowid
+    record_change(cursor, 'feedback', feedback_id, 'insert', {
+        'groupId': group_id,
+        'userId': user_id,
+        'content': content,
+        'rating': rating
+    })
     conn.commit()
     conn.close()
     return feedback_id
 
+def save_schedule(group_id, date, start_time, end_time, location='', agenda=''):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO schedules (group_id, date, start_time, end_time, location, agenda) VALUES (?, ?, ?, ?, ?, ?)',
+        (group_id, date, start_time, end_time, location, agenda)
+    )
+    schedule_id = cursor.lastrowid
+    record_change(cursor, 'schedule', schedule_id, 'insert', {
+        'groupId': group_id,
+        'date': date,
+        'startTime': start_time,
+        'endTime': end_time,
+        'location': location,
+        'agenda': agenda
+    })
+    conn.commit()
+    conn.close()
+    return schedule_id
+
 def get_skill_match_stats():
     conn = get_db_connection()
     cursor = conn.cursor()
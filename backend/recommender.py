@@ -1,16 +1,41 @@
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import random
 import logging
+import os
 import sqlite3
+import time
 import uuid
+from functools import partial
 
-from database import get_db_connection
+from database import get_db_connection, record_change
 
 logging.basicConfig(level=logging.DEBUG)
 
+# Keys that split users into independent partitions for group rebuilds.
+# 'day' uses the first available day and 'cohort' the explicit cohort/course
+# field on the user. 'skill' uses the alphabetically first skill of the
+# user's skill set, not a "primary" skill, so users who share most of their
+# skills (e.g. python+flask and python+backend) can still land in different
+# partitions and never be grouped together; prefer 'cohort' or 'day' when
+# that matters.
+PARTITION_KEYS = ('skill', 'day', 'cohort')
+GROUP_PARTITION_BY = os.environ.get('GROUP_PARTITION_BY') or None
+if GROUP_PARTITION_BY is not None and GROUP_PARTITION_BY not in PARTITION_KEYS:
+    raise ValueError(f"GROUP_PARTITION_BY must be one of {', '.join(PARTITION_KEYS)}, got {GROUP_PARTITION_BY!r}")
+GROUP_WORKERS = int(os.environ.get('GROUP_WORKERS', '0')) or None
+if GROUP_WORKERS is not None and GROUP_WORKERS < 1:
+    raise ValueError(f"GROUP_WORKERS must be a positive integer, got {GROUP_WORKERS}")
+# Exact-skill buckets smaller than this are handed to the KMeans stage
+# instead of being saved as (usually solo) groups.
+GROUP_MIN_BUCKET_SIZE = int(os.environ.get('GROUP_MIN_BUCKET_SIZE', '2'))
+# Average members per KMeans cluster.
+GROUP_TARGET_SIZE = int(os.environ.get('GROUP_TARGET_SIZE', '2'))
+GROUPING_STAGES = ('solo', 'exact', 'kmeans')
+
 def get_existing_groups():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -30,24 +55,33 @@ def get_existing_groups():
     logging.debug(f"Fetched existing groups: {len(groups)}")
     return groups
 
+def profile_from_row(row):
+    return {
+        'id': row['id'],
+        'name': row['name'].strip(),
+        'email': row['email'],
+        'skills': [s.strip().lower() for s in row['skills'].split(',')] if row['skills'] else [],
+        'availability': [a.strip() for a in row['availability'].split(',')] if row['availability'] else ['TBD'],
+        'cohort': row['cohort'].strip() if row['cohort'] else ''
+    }
+
 def get_user_profiles():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT id, name, email, skills, availability FROM users")
-    profiles = [
-        {
-            'id': row['id'],
-            'name': row['name'].strip(),
-            'email': row['email'],
-            'skills': [s.strip().lower() for s in row['skills'].split(',')] if row['skills'] else [],
-            'availability': [a.strip() for a in row['availability'].split(',')] if row['availability'] else ['TBD']
-        }
-        for row in cursor.fetchall()
-    ]
+    cursor.execute("SELECT id, name, email, skills, availability, cohort FROM users")
+    profiles = [profile_from_row(row) for row in cursor.fetchall()]
     conn.close()
     logging.debug(f"Fetched user profiles: {len(profiles)}")
     return profiles
 
+def get_user_profile(email):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name, email, skills, availability, cohort FROM users WHERE email = ?", (email,))
+    row = cursor.fetchone()
+    conn.close()
+    return profile_from_row(row) if row else None
+
 def match_student_to_group(student_profile, groups):
     student_skills = set(s.lower() for s in student_profile['skills'])
     student_availability = set(a.strip() for a in student_profile['availability']) or {'TBD'}
@@ -92,18 +126,20 @@ def save_group(group_data, retry_count=3):
         try:
             cursor.execute(
                 """
-                INSERT OR REPLACE INTO groups (name, members, matching_skills, study_time, status)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT OR REPLACE INTO groups (name, members, matching_skills, study_time, status, partition_key)
+                VALUES (?, ?, ?, ?, ?, ?)
                 """,
                 (
                     group_data['name'],
                     ','.join(group_data['members']),
                     ','.join(group_data['matching_skills']),
                     group_data['study_time'],
-                    group_data['status']
+                    group_data['status'],
+                    group_data.get('partition_key')
                 )
             )
             group_id = cursor.lastrowid
+            record_change(cursor, 'group', group_id, 'insert', group_change_payload(group_data))
             conn.commit()
             logging.debug(f"Saved group: {group_data['name']} with members {group_data['members']}")
             return group_id
@@ -120,9 +156,112 @@ def save_group(group_data, retry_count=3):
     conn.close()
     return None
 
+def group_change_payload(group_data):
+    return {
+        'name': group_data['name'],
+        'members': list(group_data['members']),
+        'matching_skills': list(group_data['matching_skills']),
+        'study_time': group_data['study_time'],
+        'status': group_data['status'],
+        'partition_key': group_data.get('partition_key')
+    }
+
+def insert_groups(cursor, groups):
+    for group_data in groups:
+        cursor.execute(
+            """
+            INSERT INTO groups (name, members, matching_skills, study_time, status, partition_key)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                group_data['name'],
+                ','.join(group_data['members']),
+                ','.join(group_data['matching_skills']),
+                group_data['study_time'],
+                group_data['status'],
+                group_data.get('partition_key')
+            )
+        )
+        record_change(cursor, 'group', cursor.lastrowid, 'insert', group_change_payload(group_data))
+
+def remove_stale_members(cursor, member_keys):
+    """Drop members from partitioned groups they no longer belong to.
+
+    ``member_keys`` maps a lowercased member name to the partition keys of
+    every user with that name. A group keeps the name if any of those users
+    belongs to its partition, so users sharing a name are never removed from
+    each other's groups.
+    """
+    cursor.execute(
+        """
+        SELECT id, name, members, matching_skills, study_time, status, partition_key
+        FROM groups WHERE members IS NOT NULL AND partition_key IS NOT NULL
+        """
+    )
+    for row in cursor.fetchall():
+        members = [m for m in row['members'].split(',') if m]
+        kept = [
+            m for m in members
+            if m.strip().lower() not in member_keys or row['partition_key'] in member_keys[m.strip().lower()]
+        ]
+        if len(kept) == len(members):
+            continue
+        if not kept:
+            cursor.execute("DELETE FROM groups WHERE id = ?", (row['id'],))
+            record_change(cursor, 'group', row['id'], 'delete')
+            continue
+        cursor.execute("UPDATE groups SET members = ? WHERE id = ?", (','.join(kept), row['id']))
+        record_change(cursor, 'group', row['id'], 'update', group_change_payload({
+            'name': row['name'],
+            'members': kept,
+            'matching_skills': row['matching_skills'].split(',') if row['matching_skills'] else [],
+            'study_time': row['study_time'],
+            'status': row['status'],
+            'partition_key': row['partition_key']
+        }))
+
+def save_groups(groups):
+    if not groups:
+        return 0
+    conn = get_db_connection()
+    with conn:
+        insert_groups(conn.cursor(), groups)
+    conn.close()
+    logging.debug(f"Saved {len(groups)} groups in bulk")
+    return len(groups)
+
+def replace_groups(groups, partition_keys=None, member_keys=None):
+    """Swap freshly clustered groups in within a single transaction.
+
+    Deletes every group, or only those in ``partition_keys``, drops stale
+    memberships described by ``member_keys`` from the groups that survive,
+    then inserts ``groups``.
+    """
+    conn = get_db_connection()
+    with conn:
+        cursor = conn.cursor()
+        if partition_keys is None:
+            cursor.execute("SELECT id FROM groups")
+        else:
+            partition_keys = list(partition_keys)
+            placeholders = ','.join('?' for _ in partition_keys)
+            cursor.execute(f"SELECT id FROM groups WHERE partition_key IN ({placeholders})", partition_keys)
+        group_ids = [row['id'] for row in cursor.fetchall()]
+        cursor.executemany("DELETE FROM groups WHERE id = ?", [(group_id,) for group_id in group_ids])
+        for group_id in group_ids:
+            record_change(cursor, 'group', group_id, 'delete')
+        if member_keys:
+            remove_stale_members(cursor, member_keys)
+        insert_groups(cursor, groups)
+    conn.close()
+    logging.debug(f"Replaced {len(group_ids)} groups with {len(groups)} groups")
+    return len(groups)
+
 def vectorize_skills(profiles):
-    skills = [' '.join(profile['skills']) for profile in profiles]
-    vectorizer = TfidfVectorizer(lowercase=True)
+    skills = [[s for s in profile['skills'] if s] for profile in profiles]
+    # Treat each skill as one token so short or symbolic names such as
+    # 'c', 'r' or 'c++' are not dropped by the default token pattern
+    vectorizer = TfidfVectorizer(analyzer=lambda profile_skills: profile_skills)
     X = vectorizer.fit_transform(skills)
     return X, vectorizer
 
@@ -133,87 +272,248 @@ def find_common_availability(cluster_profiles):
     common = set.intersection(*availability_sets)
     return ','.join(common) if common else ','.join(availability_sets[0])
 
-def initialize_groups():
-    profiles = get_user_profiles()
-    existing_groups = get_existing_groups()
-    grouped_user_emails = set()
-    for group in existing_groups:
-        for profile in profiles:
-            if profile['name'].strip().lower() in [m.strip().lower() for m in group['members']]:
-                grouped_user_emails.add(profile['email'])
-    
-    unmatched_profiles = [p for p in profiles if p['email'] not in grouped_user_emails]
-    logging.debug(f"Unmatched profiles: {len(unmatched_profiles)}")
-    
-    if not unmatched_profiles:
-        return
-    
-    for profile in unmatched_profiles:
+def get_partition_key(profile, partition_by):
+    if partition_by is None:
+        return 'all'
+    if partition_by == 'skill':
+        # Same canonical form as the exact-match buckets, so users with the
+        # same skill set always land in the same partition
+        value = sorted(set(profile['skills']))[0] if profile['skills'] else 'none'
+    elif partition_by == 'day':
+        slots = [a for a in profile['availability'] if a and a != 'TBD']
+        value = slots[0].split()[0] if slots else 'TBD'
+    elif partition_by == 'cohort':
+        value = profile.get('cohort') or 'unassigned'
+    else:
+        raise ValueError(f"Unknown partition key: {partition_by}")
+    return f"{partition_by}:{value}"
+
+def partition_profiles(profiles, partition_by=None):
+    partitions = defaultdict(list)
+    for profile in profiles:
+        partitions[get_partition_key(profile, partition_by)].append(profile)
+    return dict(partitions)
+
+def empty_grouping_stats():
+    return {stage: {'seconds': 0.0, 'groups': 0, 'members': 0} for stage in GROUPING_STAGES}
+
+def merge_grouping_stats(total, stats):
+    for stage, values in stats.items():
+        for field, value in values.items():
+            total[stage][field] += value
+    return total
+
+def build_group(cluster_profiles, matching_skills, partition_key):
+    return {
+        'name': f"Group-{uuid.uuid4().hex[:8]}",
+        'members': [profile['name'] for profile in cluster_profiles],
+        'matching_skills': list(matching_skills),
+        'study_time': find_common_availability(cluster_profiles),
+        'status': 'active',
+        'partition_key': partition_key
+    }
+
+def cluster_partition(partition, min_bucket_size=None, target_size=None):
+    """Cluster one partition of unmatched profiles into group records.
+
+    Profiles without skills become solo groups, exact skill sets shared by at
+    least ``min_bucket_size`` profiles become groups as-is, and everything
+    left over is clustered by skill similarity with KMeans. Runs without
+    touching the database so it can be executed in a worker process; returns
+    the groups to save and per-stage timings and counts.
+    """
+    partition_key, profiles = partition
+    min_bucket_size = min_bucket_size or GROUP_MIN_BUCKET_SIZE
+    target_size = target_size or GROUP_TARGET_SIZE
+    stats = empty_grouping_stats()
+    groups = []
+
+    start = time.perf_counter()
+    for profile in profiles:
         if not profile['skills']:
             group_data = {
                 'name': f"Group-{uuid.uuid4().hex[:8]}",
                 'members': [profile['name']],
                 'matching_skills': [],
                 'study_time': ','.join(profile['availability']) if profile['availability'] else 'TBD',
-                'status': 'active'
+                'status': 'active',
+                'partition_key': partition_key
             }
-            save_group(group_data)
+            groups.append(group_data)
+            stats['solo']['groups'] += 1
+            stats['solo']['members'] += 1
             logging.debug(f"Created solo group for {profile['name']}: {group_data['name']}")
-    
+    stats['solo']['seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
     skill_groups = defaultdict(list)
-    valid_profiles = [p for p in unmatched_profiles if p['skills']]
-    logging.debug(f"Valid profiles with skills: {len(valid_profiles)}")
-    
+    valid_profiles = [p for p in profiles if p['skills']]
+    logging.debug(f"Valid profiles with skills in {partition_key}: {len(valid_profiles)}")
+
     for profile in valid_profiles:
-        skills_key = tuple(sorted(profile['skills']))
+        skills_key = tuple(sorted(set(profile['skills'])))
         skill_groups[skills_key].append(profile)
-    
+
+    remaining_profiles = []
     for skills_key, cluster_profiles in skill_groups.items():
-        skills = set(skills_key)
-        study_time = find_common_availability(cluster_profiles)
-        members = [profile['name'] for profile in cluster_profiles]
-        
-        group_data = {
-            'name': f"Group-{uuid.uuid4().hex[:8]}",
-            'members': members,
-            'matching_skills': list(skills),
-            'study_time': study_time,
-            'status': 'active'
-        }
-        save_group(group_data)
-        logging.debug(f"Saved group for skills {skills}: {group_data['name']} with {len(members)} members")
-    
-    remaining_profiles = [p for p in valid_profiles if tuple(sorted(p['skills'])) not in skill_groups]
-    logging.debug(f"Remaining profiles for KMeans: {len(remaining_profiles)}")
-    
-    if len(remaining_profiles) >= 1:
-        X, vectorizer = vectorize_skills(remaining_profiles)
-        n_clusters = max(1, len(remaining_profiles) // 2)
-        kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=42)
-        labels = kmeans.fit_predict(X)
-        
+        if len(cluster_profiles) < min_bucket_size:
+            remaining_profiles.extend(cluster_profiles)
+            continue
+        group_data = build_group(cluster_profiles, skills_key, partition_key)
+        groups.append(group_data)
+        stats['exact']['groups'] += 1
+        stats['exact']['members'] += len(cluster_profiles)
+        logging.debug(f"Built group for skills {set(skills_key)}: {group_data['name']} with {len(cluster_profiles)} members")
+    stats['exact']['seconds'] = time.perf_counter() - start
+
+    logging.debug(f"Remaining profiles for KMeans in {partition_key}: {len(remaining_profiles)}")
+
+    start = time.perf_counter()
+    if remaining_profiles:
+        if len(remaining_profiles) == 1:
+            labels = [0]
+        else:
+            try:
+                X, vectorizer = vectorize_skills(remaining_profiles)
+                n_clusters = max(1, len(remaining_profiles) // target_size)
+                kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=42)
+                labels = kmeans.fit_predict(X)
+            except ValueError as e:
+                logging.warning(f"KMeans failed in {partition_key}, keeping profiles solo: {str(e)}")
+                labels = list(range(len(remaining_profiles)))
+
         clusters = defaultdict(list)
         for profile, label in zip(remaining_profiles, labels):
             clusters[label].append(profile)
-        
+
         for cluster_id, cluster_profiles in clusters.items():
             skills = [set(profile['skills']) for profile in cluster_profiles]
             common_skills = set.intersection(*skills) if len(skills) > 1 else skills[0]
             if not common_skills:
-                all_skills = set().union(*skills)
-                common_skills = list(all_skills)[:1]
+                # Label the cluster with the skill most members share
+                counts = Counter(skill for member_skills in skills for skill in member_skills)
+                common_skills = [min(counts, key=lambda skill: (-counts[skill], skill))]
             else:
-                common_skills = list(common_skills)[:2]
-            
-            study_time = find_common_availability(cluster_profiles)
-            members = [profile['name'] for profile in cluster_profiles]
-            
-            group_data = {
-                'name': f"Group-{uuid.uuid4().hex[:8]}",
-                'members': members,
-                'matching_skills': list(common_skills),
-                'study_time': study_time,
-                'status': 'active'
-            }
-            save_group(group_data)
-            logging.debug(f"Saved KMeans group: {group_data['name']} with {len(members)} members")
\ No newline at end of file
+                common_skills = sorted(common_skills)[:2]
+
+            group_data = build_group(cluster_profiles, common_skills, partition_key)
+            groups.append(group_data)
+            stats['kmeans']['groups'] += 1
+            stats['kmeans']['members'] += len(cluster_profiles)
+            logging.debug(f"Built KMeans group: {group_data['name']} with {len(cluster_profiles)} members")
+    stats['kmeans']['seconds'] = time.perf_counter() - start
+
+    return groups, stats
+
+def cluster_partitions(partitions, workers=None, min_bucket_size=None, target_size=None):
+    items = sorted(partitions.items())
+    workers = workers or GROUP_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(items)))
+    cluster = partial(cluster_partition, min_bucket_size=min_bucket_size, target_size=target_size)
+    if workers == 1:
+        results = [cluster(item) for item in items]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(cluster, items))
+    logging.debug(f"Clustered {len(items)} partitions with {workers} workers")
+
+    groups = []
+    stats = empty_grouping_stats()
+    for partition_groups, partition_stats in results:
+        groups.extend(partition_groups)
+        merge_grouping_stats(stats, partition_stats)
+    return groups, stats
+
+def get_unmatched_profiles(profiles, existing_groups):
+    grouped_names = set()
+    for group in existing_groups:
+        grouped_names.update(m.strip().lower() for m in group['members'])
+    return [p for p in profiles if p['name'].strip().lower() not in grouped_names]
+
+def get_stored_partitionings():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT partition_key FROM groups WHERE partition_key IS NOT NULL")
+    keys = [row['partition_key'] for row in cursor.fetchall()]
+    conn.close()
+    return {None if key == 'all' else key.split(':', 1)[0] for key in keys}
+
+def get_current_partitioning():
+    stored = get_stored_partitionings()
+    return next(iter(stored)) if len(stored) == 1 else GROUP_PARTITION_BY
+
+def run_grouping(profiles, partition_by, write, workers=None, min_bucket_size=None, target_size=None):
+    partitions = partition_profiles(profiles, partition_by)
+    logging.debug(f"Partitions by {partition_by or 'none'}: {len(partitions)}")
+
+    start = time.perf_counter()
+    groups, stats = cluster_partitions(partitions, workers, min_bucket_size, target_size)
+    cluster_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    created = write(groups)
+    stats.update({
+        'profiles': len(profiles),
+        'partitions': len(partitions),
+        'created': created,
+        'cluster_seconds': cluster_seconds,
+        'save_seconds': time.perf_counter() - start
+    })
+    logging.info(f"Grouping stats: {stats}")
+    return stats
+
+def initialize_groups(workers=None, min_bucket_size=None, target_size=None):
+    """Group users who are in no group yet, using the stored partitioning."""
+    partition_by = get_current_partitioning()
+    profiles = get_user_profiles()
+    existing_groups = get_existing_groups()
+    unmatched_profiles = get_unmatched_profiles(profiles, existing_groups)
+    logging.debug(f"Unmatched profiles: {len(unmatched_profiles)}")
+    return run_grouping(unmatched_profiles, partition_by, save_groups, workers, min_bucket_size, target_size)
+
+def rebuild_groups(partition_by=GROUP_PARTITION_BY, workers=None, min_bucket_size=None, target_size=None):
+    """Recluster every user and replace all groups in one transaction."""
+    if partition_by is not None and partition_by not in PARTITION_KEYS:
+        raise ValueError(f"Unknown partition key: {partition_by}")
+    profiles = get_user_profiles()
+    return run_grouping(profiles, partition_by, replace_groups, workers, min_bucket_size, target_size)
+
+def rebuild_partitions(partition_by, partition_keys, workers=None, min_bucket_size=None, target_size=None):
+    """Recluster every user whose partition key is in ``partition_keys``.
+
+    The old groups of those partitions are replaced, and the users are
+    removed from groups of other partitions they no longer belong to (e.g.
+    after their skills or cohort changed), all in one transaction.
+    """
+    partition_keys = set(partition_keys)
+    all_profiles = get_user_profiles()
+    keys_by_name = defaultdict(set)
+    for profile in all_profiles:
+        keys_by_name[profile['name'].strip().lower()].add(get_partition_key(profile, partition_by))
+
+    profiles = [p for p in all_profiles if get_partition_key(p, partition_by) in partition_keys]
+    logging.debug(f"Profiles in {sorted(partition_keys)}: {len(profiles)}")
+    member_keys = {p['name'].strip().lower(): keys_by_name[p['name'].strip().lower()] for p in profiles}
+    write = partial(replace_groups, partition_keys=partition_keys, member_keys=member_keys)
+    return run_grouping(profiles, partition_by, write, workers, min_bucket_size, target_size)
+
+def rebuild_partition(partition_by, partition, workers=None, min_bucket_size=None, target_size=None):
+    if partition_by not in PARTITION_KEYS:
+        raise ValueError(f"partitionBy must be one of {', '.join(PARTITION_KEYS)}")
+    stored = get_stored_partitionings()
+    if stored and stored != {partition_by}:
+        current = ', '.join(sorted(key or 'none' for key in stored))
+        raise ValueError(f"Groups are partitioned by {current}, not {partition_by}; reinitialize all groups first")
+    return rebuild_partitions(partition_by, {f"{partition_by}:{partition}"}, workers, min_bucket_size, target_size)
+
+def rebuild_user_partitions(*profiles):
+    """Rebuild the partitions holding the given profiles.
+
+    Pass a user's profile from before and after a change so both the
+    partition they left and the one they joined are rebuilt.
+    """
+    partition_by = get_current_partitioning()
+    partition_keys = {get_partition_key(p, partition_by) for p in profiles if p}
+    # Runs on the request path for a handful of profiles; a process pool
+    # would cost more than it saves
+    return rebuild_partitions(partition_by, partition_keys, workers=1)
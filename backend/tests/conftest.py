@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other by bare name (``from database import ...``)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Point the backend at a fresh, seeded database in a temp directory."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'test.db'))
+    database.init_db()
+    return database
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from recommender import replace_groups, save_group, save_groups
+
+GROUP = {'name': 'G', 'members': ['Amir Ibrahim'], 'matching_skills': ['python'], 'study_time': 'TBD', 'status': 'active'}
+
+def all_changes(db):
+    changes, has_more = db.get_changes(0, 10 ** 6)
+    assert not has_more
+    return changes
+
+def test_save_user_keeps_id_on_update(db):
+    user_id = db.save_user('amir@example.com', 'Amir Ibrahim', skills='python')
+    assert user_id == 1
+    assert db.get_user_by_email('amir@example.com')['skills'] == 'python'
+
+    new_id = db.save_user('new@example.com', 'New User')
+    assert db.save_user('new@example.com', 'New User', skills='ml') == new_id
+
+def test_each_mutation_logs_one_entry_in_order(db):
+    mutations = [
+        (lambda: db.save_user('new@example.com', 'New User', skills='ml', cohort='cs101'), 'user', 'insert'),
+        (lambda: db.save_user('new@example.com', 'New User', skills='ml,r'), 'user', 'update'),
+        (lambda: save_group(dict(GROUP)), 'group', 'insert'),
+        (lambda: db.save_feedback(1, 1, 'Great', 5), 'feedback', 'insert'),
+        (lambda: db.save_schedule(1, '2025-06-01', '10:00', '12:00'), 'schedule', 'insert'),
+    ]
+    last_seq = 0
+    for mutate, entity, op in mutations:
+        before = len(all_changes(db))
+        entity_id = mutate()
+        changes = all_changes(db)
+        assert len(changes) == before + 1
+        change = changes[-1]
+        assert (change['entity'], change['entityId'], change['op']) == (entity, entity_id, op)
+        assert change['seq'] > last_seq
+        last_seq = change['seq']
+
+def test_user_changes_omit_email(db):
+    db.save_user('new@example.com', 'New User', skills='ml', availability='Mon 10-12', cohort='cs101')
+    data = all_changes(db)[-1]['data']
+    assert 'email' not in data
+    assert data == {'name': 'New User', 'skills': ['ml'], 'interests': [], 'availability': ['Mon 10-12'], 'cohort': 'cs101'}
+
+def test_get_changes_pages_with_has_more(db):
+    for i in range(5):
+        db.save_user(f"user{i}@example.com", f"User {i}")
+    seqs = [change['seq'] for change in all_changes(db)]
+    assert len(seqs) == 5
+
+    page, has_more = db.get_changes(0, 2)
+    assert [c['seq'] for c in page] == seqs[:2] and has_more
+    page, has_more = db.get_changes(page[-1]['seq'], 3)
+    assert [c['seq'] for c in page] == seqs[2:] and not has_more
+    page, has_more = db.get_changes(seqs[-1], 3)
+    assert page == [] and not has_more
+
+def test_failed_replace_groups_writes_no_changes(db):
+    save_groups([dict(GROUP)])
+    before = all_changes(db)
+
+    with pytest.raises(KeyError):
+        replace_groups([dict(GROUP), {'name': 'Broken', 'members': [], 'matching_skills': [], 'study_time': 'TBD'}])
+
+    assert all_changes(db) == before
+
+def test_failed_save_user_releases_write_lock(db):
+    # An unbindable value fails after BEGIN IMMEDIATE; the traceback held by
+    # excinfo would keep a leaked connection, and its lock, alive
+    with pytest.raises(sqlite3.Error) as excinfo:
+        db.save_user('new@example.com', 'New User', cohort=object())
+    assert excinfo.value
+    assert db.save_user('new@example.com', 'New User') > 0
@@ -0,0 +1,105 @@
+import pytest
+
+import recommender
+from recommender import (
+    get_stored_partitionings,
+    get_user_profile,
+    initialize_groups,
+    rebuild_groups,
+    rebuild_partition,
+    rebuild_user_partitions,
+    replace_groups,
+    save_groups,
+)
+
+def fetch_groups(db):
+    conn = db.get_db_connection()
+    rows = conn.execute('SELECT id, name, members, partition_key FROM groups ORDER BY id').fetchall()
+    conn.close()
+    return [
+        {'id': row['id'], 'name': row['name'], 'members': row['members'].split(','), 'partition_key': row['partition_key']}
+        for row in rows
+    ]
+
+def groups_of(db, name):
+    return [g for g in fetch_groups(db) if name in g['members']]
+
+def test_rebuild_partition_leaves_other_partitions_untouched(db):
+    rebuild_groups('skill', workers=1)
+    others = [g for g in fetch_groups(db) if g['partition_key'] != 'skill:flask']
+
+    rebuild_partition('skill', 'flask')
+
+    groups = fetch_groups(db)
+    assert [g for g in groups if g['partition_key'] != 'skill:flask'] == others
+    assert [g['partition_key'] for g in groups_of(db, 'Amir Ibrahim')] == ['skill:flask']
+
+def test_user_moving_partitions_follows_them(db):
+    rebuild_groups('skill', workers=1)
+    previous = get_user_profile('amir@example.com')
+    db.save_user('amir@example.com', 'Amir Ibrahim', skills='ux,ui', availability='Wed 10-12')
+
+    rebuild_user_partitions(previous, get_user_profile('amir@example.com'))
+
+    assert [g['partition_key'] for g in groups_of(db, 'Amir Ibrahim')] == ['skill:ui']
+    assert not [g for g in fetch_groups(db) if g['partition_key'] == 'skill:flask']
+
+def test_rebuilding_only_the_new_partition_drops_stale_membership(db):
+    rebuild_groups('skill', workers=1)
+    db.save_user('amir@example.com', 'Amir Ibrahim', skills='ux,ui', availability='Wed 10-12')
+
+    rebuild_partition('skill', 'ui')
+
+    assert [g['partition_key'] for g in groups_of(db, 'Amir Ibrahim')] == ['skill:ui']
+
+def test_shared_name_does_not_touch_other_users_group(db):
+    rebuild_groups('skill', workers=1)
+    original = groups_of(db, 'Amir Ibrahim')
+    db.save_user('amir2@example.com', 'Amir Ibrahim')
+
+    rebuild_user_partitions(get_user_profile('amir2@example.com'))
+
+    groups = groups_of(db, 'Amir Ibrahim')
+    assert [g for g in groups if g['partition_key'] == 'skill:flask'] == original
+    assert [g['partition_key'] for g in groups if g['partition_key'] != 'skill:flask'] == ['skill:none']
+
+def test_mismatched_partitioning_is_rejected(db):
+    rebuild_groups('skill', workers=1)
+    with pytest.raises(ValueError):
+        rebuild_partition('cohort', 'cs101')
+
+    save_groups([{
+        'name': 'Legacy', 'members': ['Someone'], 'matching_skills': [],
+        'study_time': 'TBD', 'status': 'active', 'partition_key': 'all'
+    }])
+    assert get_stored_partitionings() == {'skill', None}
+    with pytest.raises(ValueError):
+        rebuild_partition('skill', 'flask')
+
+def test_initialize_groups_keeps_stored_partitioning(db):
+    rebuild_groups('skill', workers=1)
+    db.save_user('new@example.com', 'New User', skills='python,flask')
+
+    initialize_groups(workers=1)
+
+    assert get_stored_partitionings() == {'skill'}
+    assert [g['partition_key'] for g in groups_of(db, 'New User')] == ['skill:flask']
+
+def test_replace_groups_is_atomic(db):
+    rebuild_groups('skill', workers=1)
+    before = fetch_groups(db)
+    broken = [
+        {'name': 'Ok', 'members': ['A'], 'matching_skills': [], 'study_time': 'TBD', 'status': 'active'},
+        {'name': 'Broken', 'members': ['B'], 'matching_skills': [], 'study_time': 'TBD'},
+    ]
+
+    with pytest.raises(KeyError):
+        replace_groups(broken)
+
+    assert fetch_groups(db) == before
+
+def test_skill_partition_groups_match_skill_key(db):
+    rebuild_groups('skill', workers=1)
+    for profile in recommender.get_user_profiles():
+        expected = recommender.get_partition_key(profile, 'skill')
+        assert expected in [g['partition_key'] for g in groups_of(db, profile['name'])]
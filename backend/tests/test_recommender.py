@@ -0,0 +1,67 @@
+import recommender
+from recommender import cluster_partition, get_partition_key
+
+def make_profile(i, skills, availability=('Mon 10-12',)):
+    return {
+        'id': i,
+        'name': f"User {i}",
+        'email': f"user{i}@example.com",
+        'skills': list(skills),
+        'availability': list(availability),
+        'cohort': ''
+    }
+
+PROFILES = [
+    make_profile(1, ['python', 'flask']),
+    make_profile(2, ['flask', 'python']),
+    make_profile(3, ['python', 'django']),
+    make_profile(4, ['ml']),
+    make_profile(5, ['ml', 'data analysis']),
+    make_profile(6, ['c']),
+    make_profile(7, ['r']),
+    make_profile(8, ['c++']),
+    make_profile(9, []),
+]
+
+def test_singleton_skill_sets_reach_kmeans():
+    groups, stats = cluster_partition(('all', PROFILES), min_bucket_size=2)
+
+    assert stats['exact']['groups'] == 1
+    assert stats['exact']['members'] == 2
+    assert stats['kmeans']['members'] > 0
+    assert stats['solo']['members'] == 1
+
+    members = [member for group in groups for member in group['members']]
+    assert sorted(members) == sorted(p['name'] for p in PROFILES)
+
+def test_single_character_skills_are_clustered():
+    profiles = [make_profile(i, [skill]) for i, skill in enumerate(['c', 'r', 'c++', 'go'])]
+    groups, stats = cluster_partition(('all', profiles), min_bucket_size=2)
+
+    assert stats['kmeans']['members'] == len(profiles)
+    assert sum(len(group['members']) for group in groups) == len(profiles)
+
+def test_skill_partition_key_ignores_skill_order():
+    assert get_partition_key(PROFILES[0], 'skill') == get_partition_key(PROFILES[1], 'skill') == 'skill:flask'
+
+class OneCluster:
+    """KMeans stand-in that puts every profile in the same cluster."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def fit_predict(self, X):
+        return [0] * X.shape[0]
+
+def test_kmeans_label_is_most_shared_skill(monkeypatch):
+    monkeypatch.setattr(recommender, 'KMeans', OneCluster)
+    profiles = [
+        make_profile(1, ['python', 'backend']),
+        make_profile(2, ['python', 'flask']),
+        make_profile(3, ['python', 'django']),
+        make_profile(4, ['ml']),
+    ]
+    groups, stats = cluster_partition(('all', profiles), min_bucket_size=2)
+
+    assert stats['kmeans']['groups'] == 1
+    assert groups[0]['matching_skills'] == ['python']